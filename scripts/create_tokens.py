@@ -8,16 +8,25 @@ AnyRouter Token 批量创建工具
 
 import argparse
 import asyncio
+import base64
+import http.cookiejar
+import itertools
 import json
+import math
 import random
-import string
+import re
+import secrets
 import time
 import sys
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print("请先安装 requests: pip install requests")
     sys.exit(1)
@@ -27,79 +36,183 @@ try:
 except ImportError:
     async_playwright = None
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON 编解码: 优先使用 orjson (更快)，未安装时回退到标准库
+if orjson is not None:
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+    def _json_line(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+else:
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def _json_line(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
 
 # Cookie API 配置
 COOKIE_API_URL = "https://cookie.ronghuaxueleng.top/api/cookies"
 COOKIE_API_DOMAIN = "anyrouter.top"
+# 响应可能是数组，也可能是 {"data": [...]} / {"cookies": [...]}
+_COOKIE_API_ITEM_PREFIXES = frozenset({"item", "data.item", "cookies.item"})
 
 # WAF 相关配置
 WAF_TARGET_URL = "https://anyrouter.top/login"
-WAF_REQUIRED_COOKIES = ["acw_tc", "cdn_sec_tc", "acw_sc__v2"]
+WAF_REQUIRED_COOKIES = frozenset({"acw_tc", "cdn_sec_tc", "acw_sc__v2"})
+
+# 浏览器启动参数 (只需提取 cookie，无需界面和持久化用户目录)
+_BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36"
+_CHROMIUM_ARGS = (
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+    "--no-sandbox",
+)
+_LAUNCH_BASE = {"headless": True, "args": _CHROMIUM_ARGS}
+_CONTEXT_OPTIONS = {
+    "user_agent": _BROWSER_USER_AGENT,
+    "viewport": {"width": 1920, "height": 1080},
+}
+# 获取 WAF cookies 时不需要加载的资源类型
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+
+# WAF cookies 本地缓存 (acw_tc 有效期为 30 分钟)
+_WAF_CACHE = Path.home() / ".cache" / "anyrouter_waf.json"
+_WAF_TTL = 1800
+
+# session 解码后提取 user_id 的模式
+_GITHUB_ID_RE = re.compile(r"github_(\d+)")
+_ID_INT_RE = re.compile(r"id.int.{2,4}(\d+)")
+
+# cookie 字符串中的 name=value 对
+_COOKIE_PAIR_RE = re.compile(r"\s*([^=;\s]+)\s*=\s*([^;]*?)\s*(?:;|$)")
+
+
+async def _wait_for_waf_cookies(context, names: frozenset[str], timeout: float) -> bool:
+    """轮询直到指定的 WAF cookies 出现
+
+    acw_tc 等 cookie 带 HttpOnly，document.cookie 读不到，因此直接查询浏览器上下文。
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        present = {c.get("name") for c in await context.cookies()}
+        if names <= present:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.2)
+
+
+async def _block_static_resources(route):
+    """拦截图片/字体/样式等与 WAF 验证无关的资源，加快页面加载"""
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def get_waf_cookies(proxy: str = None) -> dict[str, str] | None:
-    """使用 Playwright 获取 WAF cookies (参考 anyrouter-check-in 项目)"""
+    """使用 Playwright 获取 WAF cookies (参考 anyrouter-check-in 项目)，失败时返回 None"""
     if async_playwright is None:
         print("[ERROR] 未安装 playwright, 请运行: pip install playwright && playwright install chromium")
         return None
 
     print("[WAF] 启动浏览器获取 WAF cookies...")
 
+    context_options = {**_CONTEXT_OPTIONS, "proxy": {"server": proxy}} if proxy else _CONTEXT_OPTIONS
+
     async with async_playwright() as p:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # 构建启动参数
-            launch_options = {
-                "user_data_dir": temp_dir,
-                "headless": False,
-                "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36",
-                "viewport": {"width": 1920, "height": 1080},
-                "args": [
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-dev-shm-usage",
-                    "--disable-web-security",
-                    "--disable-features=VizDisplayCompositor",
-                    "--no-sandbox",
-                ],
+        browser = None
+        try:
+            browser = await p.chromium.launch(**_LAUNCH_BASE)
+            context = await browser.new_context(**context_options)
+            page = await context.new_page()
+            await page.route("**/*", _block_static_resources)
+
+            print(f"[WAF] 访问 {WAF_TARGET_URL} 等待 WAF 验证...")
+            await page.goto(WAF_TARGET_URL, wait_until="domcontentloaded")
+
+            # 所需 WAF cookies 全部出现即返回 (WAF 的 JS 验证会在 DOMContentLoaded 之后写入)，
+            # 超时则按已获取到的继续
+            await _wait_for_waf_cookies(context, WAF_REQUIRED_COOKIES, timeout=15)
+
+            # 只取目标 URL 作用域内的 cookie
+            cookies = await context.cookies([WAF_TARGET_URL])
+            waf_cookies = {
+                c["name"]: c["value"]
+                for c in cookies
+                if c["name"] in WAF_REQUIRED_COOKIES and c.get("value") is not None
             }
-            if proxy:
-                launch_options["proxy"] = {"server": proxy}
 
-            context = await p.chromium.launch_persistent_context(**launch_options)
+            missing = WAF_REQUIRED_COOKIES - waf_cookies.keys()
+            if missing:
+                print(f"[WAF] 部分 WAF cookies 未获取到: {sorted(missing)} (可能不影响使用)")
 
-            page = await context.new_page()
+            print(f"[WAF] 成功获取 {len(waf_cookies)} 个 WAF cookies: {list(waf_cookies.keys())}")
+            return waf_cookies
 
-            try:
-                print(f"[WAF] 访问 {WAF_TARGET_URL} 等待 WAF 验证...")
-                await page.goto(WAF_TARGET_URL, wait_until="networkidle")
+        except Exception as e:
+            print(f"[WAF] 获取 WAF cookies 失败: {e}")
+            return None
 
-                try:
-                    await page.wait_for_function(
-                        'document.readyState === "complete"', timeout=5000
-                    )
-                except Exception:
-                    await page.wait_for_timeout(3000)
+        finally:
+            if browser is not None:
+                await browser.close()
+
+
+def load_cached_waf_cookies(proxy: str = None) -> dict[str, str] | None:
+    """读取未过期的 WAF cookies 缓存 (WAF 会校验来源 IP，代理不同时不复用)"""
+    try:
+        data = _json_loads(_WAF_CACHE.read_bytes())
+        if data.get("proxy") == proxy and time.time() - data["ts"] < _WAF_TTL:
+            return data["cookies"] or None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None
 
-                cookies = await page.context.cookies()
 
-                waf_cookies = {}
-                for cookie in cookies:
-                    name = cookie.get("name")
-                    value = cookie.get("value")
-                    if name in WAF_REQUIRED_COOKIES and value is not None:
-                        waf_cookies[name] = value
+def save_waf_cookies(waf_cookies: dict[str, str], proxy: str = None):
+    """缓存 WAF cookies，供后续运行跳过浏览器"""
+    try:
+        _WAF_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        _WAF_CACHE.write_bytes(
+            _json_dumps({"ts": time.time(), "proxy": proxy, "cookies": waf_cookies})
+        )
+    except OSError as e:
+        print(f"[WAF] 写入缓存失败: {e}")
 
-                missing = [c for c in WAF_REQUIRED_COOKIES if c not in waf_cookies]
-                if missing:
-                    print(f"[WAF] 部分 WAF cookies 未获取到: {missing} (可能不影响使用)")
 
-                print(f"[WAF] 成功获取 {len(waf_cookies)} 个 WAF cookies: {list(waf_cookies.keys())}")
-                await context.close()
-                return waf_cookies
+async def resolve_waf_cookies(proxy: str = None, refresh: bool = False) -> dict[str, str]:
+    """获取 WAF cookies：优先使用未过期的缓存，否则启动浏览器获取并写入缓存"""
+    if not refresh and (cached := load_cached_waf_cookies(proxy)):
+        print(f"[WAF] 使用缓存的 WAF cookies: {list(cached.keys())} ({_WAF_CACHE})")
+        return cached
 
-            except Exception as e:
-                print(f"[WAF] 获取 WAF cookies 失败: {e}")
-                await context.close()
-                return None
+    waf_cookies = await get_waf_cookies(proxy=proxy)
+    if waf_cookies is None:
+        print("[WAF] 无法获取 WAF cookies, 将尝试不带 WAF cookies 继续")
+        return {}
+    if waf_cookies:
+        save_waf_cookies(waf_cookies, proxy)
+    return waf_cookies
 
 
 def merge_waf_cookies(original_cookie: str, waf_cookies: dict[str, str]) -> str:
@@ -108,48 +221,38 @@ def merge_waf_cookies(original_cookie: str, waf_cookies: dict[str, str]) -> str:
         return original_cookie
 
     # 解析原始 cookie 为 dict
-    existing = {}
-    if original_cookie:
-        for part in original_cookie.split(";"):
-            part = part.strip()
-            if "=" in part:
-                k, v = part.split("=", 1)
-                existing[k.strip()] = v.strip()
+    existing = dict(_COOKIE_PAIR_RE.findall(original_cookie)) if original_cookie else {}
 
     # WAF cookies 优先（覆盖同名的旧值）
     existing.update(waf_cookies)
 
-    return "; ".join(f"{k}={v}" for k, v in existing.items())
+    return "; ".join(map("=".join, existing.items()))
+
+
+def has_waf_cookies(cookie: str) -> bool:
+    """判断 cookie 字符串是否已包含全部 WAF cookies"""
+    return WAF_REQUIRED_COOKIES.issubset(name for name, _ in _COOKIE_PAIR_RE.findall(cookie or ""))
 
 
 def extract_user_id_from_session(session_value: str) -> str | None:
     """从session cookie中提取user_id"""
-    import base64
-    import re
-
     try:
         # session格式: base64编码的数据|签名
         parts = session_value.split("|")
         if not parts:
             return None
 
-        # 尝试解码base64部分
-        encoded = parts[0]
-        # 补齐padding
-        padding = 4 - len(encoded) % 4
-        if padding != 4:
-            encoded += "=" * padding
-
-        decoded = base64.b64decode(encoded).decode("utf-8", errors="ignore")
+        # 尝试解码base64部分 (多余的 padding 会被忽略，无需计算补齐长度)
+        decoded = base64.b64decode(parts[0] + "===").decode("utf-8", errors="ignore")
 
         # 方法1: 查找 github_XXXX 格式的用户名来提取ID
-        match = re.search(r"github_(\d+)", decoded)
+        match = _GITHUB_ID_RE.search(decoded)
         if match:
             return match.group(1)
 
         # 方法2: 查找其他可能的用户ID模式
         # 格式可能是 id...int...<数字>
-        match = re.search(r"id.int.{2,4}(\d+)", decoded)
+        match = _ID_INT_RE.search(decoded)
         if match:
             return match.group(1)
 
@@ -159,6 +262,46 @@ def extract_user_id_from_session(session_value: str) -> str | None:
     return None
 
 
+def _iter_cookie_api_items(resp: "requests.Response"):
+    """逐条产出 Cookie API 返回的条目
+
+    安装了 ijson 时边下载边解析，内存只占用单条记录；否则整体解析 JSON。
+    """
+    if ijson is None:
+        data = _json_loads(resp.content)
+        yield from data if isinstance(data, list) else data.get("data", data.get("cookies", []))
+        return
+
+    resp.raw.decode_content = True
+    builder = None
+    item_prefix = None
+    # 与整体解析一致: 有顶层 data 字段时只取 data，否则取 cookies。
+    # 字段顺序不固定，cookies 中的条目先暂存，确认没有 data 后再产出
+    has_data = False
+    pending_cookies = []
+    for prefix, event, value in ijson.parse(resp.raw):
+        if builder is None:
+            if prefix == "" and event == "map_key" and value == "data":
+                has_data = True
+                pending_cookies.clear()
+            if event != "start_map" or prefix not in _COOKIE_API_ITEM_PREFIXES:
+                continue
+            if has_data and prefix == "cookies.item":
+                continue
+            builder = ijson.ObjectBuilder()
+            item_prefix = prefix
+        builder.event(event, value)
+        if event == "end_map" and prefix == item_prefix:
+            if item_prefix == "cookies.item":
+                pending_cookies.append(builder.value)
+            else:
+                yield builder.value
+            builder = None
+
+    if not has_data:
+        yield from pending_cookies
+
+
 def fetch_cookies_from_api(api_token: str) -> list[dict]:
     """从Cookie API获取cookie列表"""
     headers = {"Authorization": f"Bearer {api_token}"}
@@ -170,62 +313,54 @@ def fetch_cookies_from_api(api_token: str) -> list[dict]:
     }
 
     try:
-        resp = requests.get(COOKIE_API_URL, headers=headers, params=params, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-
-        accounts = []
-        cookies_data = data if isinstance(data, list) else data.get("data", data.get("cookies", []))
-
-        for item in cookies_data:
-            if not isinstance(item, dict):
-                continue
+        # stream=True 时需关闭响应才会释放连接
+        with requests.get(
+            COOKIE_API_URL, headers=headers, params=params, timeout=30, stream=True
+        ) as resp:
+            resp.raise_for_status()
+
+            accounts = []
+            for item in _iter_cookie_api_items(resp):
+                if not isinstance(item, dict):
+                    continue
+
+                # 跳过检测失败的cookie
+                detection_status = item.get("detection_status", "")
+                if detection_status in ["error", "failed"]:
+                    custom_name = item.get("custom_name", "unknown")
+                    print(f"  跳过失效cookie: {custom_name} ({detection_status})")
+                    continue
+
+                # 从cookies_data构建cookie字符串
+                cookie_str = "; ".join(
+                    f'{c["name"]}={c["value"]}'
+                    for c in item.get("cookies_data") or ()
+                    if c.get("name") and c.get("value")
+                )
+                if not cookie_str:
+                    continue
+
+                # 从 local_storage_data.user.id 获取 user_id
+                user_id = None
+                local_storage = item.get("local_storage_data", {})
+                if isinstance(local_storage, dict):
+                    user = local_storage.get("user", {})
+                    if isinstance(user, dict):
+                        user_id = user.get("id")
+                        if user_id:
+                            user_id = str(user_id)
 
-            # 跳过检测失败的cookie
-            detection_status = item.get("detection_status", "")
-            if detection_status in ["error", "failed"]:
                 custom_name = item.get("custom_name", "unknown")
-                print(f"  跳过失效cookie: {custom_name} ({detection_status})")
-                continue
-
-            # 从cookies_data构建cookie字符串
-            cookies_list = item.get("cookies_data", [])
-            if not cookies_list:
-                continue
-
-            cookie_parts = []
-            for c in cookies_list:
-                name = c.get("name", "")
-                value = c.get("value", "")
-                if name and value:
-                    cookie_parts.append(f"{name}={value}")
-
-            if not cookie_parts:
-                continue
-
-            cookie_str = "; ".join(cookie_parts)
-
-            # 从 local_storage_data.user.id 获取 user_id
-            user_id = None
-            local_storage = item.get("local_storage_data", {})
-            if isinstance(local_storage, dict):
-                user = local_storage.get("user", {})
-                if isinstance(user, dict):
-                    user_id = user.get("id")
-                    if user_id:
-                        user_id = str(user_id)
-
-            custom_name = item.get("custom_name", "unknown")
-            if user_id:
-                print(f"  发现账号: {custom_name} (user_id: {user_id})")
-            else:
-                print(f"  发现账号: {custom_name} (user_id: 未知)")
+                if user_id:
+                    print(f"  发现账号: {custom_name} (user_id: {user_id})")
+                else:
+                    print(f"  发现账号: {custom_name} (user_id: 未知)")
 
-            accounts.append({
-                "cookie": cookie_str,
-                "user_id": user_id,
-                "name": custom_name,
-            })
+                accounts.append({
+                    "cookie": cookie_str,
+                    "user_id": user_id,
+                    "name": custom_name,
+                })
 
         print(f"\n从API获取到 {len(accounts)} 个有效cookie")
         return accounts
@@ -235,6 +370,80 @@ def fetch_cookies_from_api(api_token: str) -> list[dict]:
         sys.exit(1)
 
 
+def rate_limit_wait(headers) -> float:
+    """从响应头 (Retry-After / X-RateLimit-*) 解析需要等待的秒数，无限制时返回 0"""
+    if not headers:
+        return 0.0
+
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            # HTTP-date 格式
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                return 0.0
+
+    if headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            reset = float(headers.get("X-RateLimit-Reset", ""))
+        except ValueError:
+            return 0.0
+        # 可能是 Unix 时间戳，也可能是剩余秒数
+        return max(0.0, reset - time.time() if reset > 1e9 else reset)
+
+    return 0.0
+
+
+_print_lock = threading.Lock()
+
+
+def _account_log(user_id, message: str):
+    """输出账号相关的日志
+
+    多个账号在不同线程中同时处理，每行加上用户ID前缀，且整条消息加锁一次写出，避免行之间交错。
+    """
+    prefix = f"[用户 {user_id}] "
+    text = "\n".join(prefix + line if line else line for line in message.split("\n"))
+    with _print_lock:
+        print(text, flush=True)
+
+
+class RateLimiter:
+    """单个账号的请求节奏控制
+
+    两次请求的开始时间至少间隔 interval 秒 (请求本身耗时计入间隔)，
+    服务端通过响应头要求等待时再额外推迟 (最多 max_wait 秒)。
+    """
+
+    def __init__(self, interval: float, max_wait: float = 60):
+        self.interval = interval
+        self.max_wait = max_wait
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        # 醒来后重新检查：睡眠期间 update() 可能因服务端限流把时间继续推后
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._next_allowed - now
+                if delay <= 0:
+                    self._next_allowed = now + self.interval
+                    return
+            time.sleep(delay)
+
+    def update(self, headers):
+        wait = rate_limit_wait(headers)
+        if wait:
+            # 限制最长等待，避免异常的 Retry-After 让账号长时间停滞
+            wait = min(wait, self.max_wait)
+            with self._lock:
+                self._next_allowed = max(self._next_allowed, time.monotonic() + wait)
+
+
 class TokenCreator:
     API_URL = "https://anyrouter.top/api/token/"
     SEARCH_API_URL = "https://anyrouter.top/api/token/search"
@@ -257,138 +466,263 @@ class TokenCreator:
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/132.0.0.0 Safari/537.36",
     }
 
+    # 遇到限流/服务端错误时指数退避重试
+    RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+    # POST 不是幂等的，5xx 时服务端可能已创建成功，只在被限流 (未处理) 时重试
+    RETRY_STATUS_POST = frozenset({429})
+    MAX_RETRIES = 4
+    RETRY_BACKOFF = 0.3
+    RETRY_BACKOFF_MAX = 10
+    # 服务端 Retry-After 的最长等待
+    RETRY_MAX_WAIT = 60
+
+    # 单个账号内并发请求 (创建/删除 token) 的线程数
+    MAX_WORKERS = 8
+
     def __init__(self, token_config: dict, proxy: str = None):
         self.token_config = token_config
-        self.created_tokens = []
+        # 创建 token 时除 name 外的请求体字段，配置不变，只构建一次
+        self._payload_base = {
+            "remain_quota": token_config.get("remain_quota", 500000),
+            "expired_time": token_config.get("expired_time", -1),
+            "unlimited_quota": token_config.get("unlimited_quota", True),
+            "model_limits_enabled": token_config.get("model_limits_enabled", False),
+            "model_limits": token_config.get("model_limits", ""),
+            "allow_ips": token_config.get("allow_ips", ""),
+            "group": token_config.get("group", ""),
+        }
         self.proxies = {"http": proxy, "https": proxy} if proxy else None
 
-    def search_tokens(self, cookie: str, user_id: str, keyword: str) -> dict[str, str]:
-        """搜索 token 获取实际的 key，返回 {name: key} 映射"""
-        headers = self.HEADERS.copy()
-        headers["cookie"] = cookie
-        headers["new-api-user"] = user_id
-        # 搜索 API 是 GET 请求，不需要 content-type
-        headers.pop("content-type", None)
+        # 复用连接 (keep-alive)，避免每个请求都重新进行 TCP/TLS 握手
+        self._session = requests.Session()
+        # 连接池需容纳 账号并发数 x MAX_WORKERS 个同时进行的请求；
+        # 连接建立失败由 urllib3 重试 (请求尚未发出，对 POST 也安全)，状态码重试见 _request
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=64,
+            max_retries=Retry(connect=3, read=0, status=0, backoff_factor=0.3),
+        )
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # 各账号共用一个 session，禁止 cookie jar 保存响应的 Set-Cookie，
+        # 否则重定向时可能把一个账号的 cookie 带到另一个账号的请求中
+        self._session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        # 静态请求头作为 session 默认头；content-type 只有 POST 需要，由 _headers_for 单独设置
+        self._session.headers.update(
+            {k: v for k, v in self.HEADERS.items() if k != "content-type"}
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
+    def close(self):
+        self._session.close()
+
+    def _request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """发送请求，遇到 429/5xx 时重试：优先遵循 Retry-After，否则带随机抖动的指数退避"""
+        retry_status = self.RETRY_STATUS_POST if method == "POST" else self.RETRY_STATUS
+        for attempt in range(self.MAX_RETRIES + 1):
+            # 代理按请求传入: session.proxies 的优先级低于环境变量中的代理，会导致 --proxy 被忽略
+            resp = self._session.request(
+                method, url, timeout=30, proxies=self.proxies, **kwargs
+            )
+            if resp.status_code not in retry_status or attempt == self.MAX_RETRIES:
+                return resp
+            wait = rate_limit_wait(resp.headers)
+            if wait:
+                wait = min(wait, self.RETRY_MAX_WAIT)
+            else:
+                # 抖动避免多个线程同时被限流后又同时重试
+                wait = min(self.RETRY_BACKOFF * 2**attempt + random.uniform(0, 1), self.RETRY_BACKOFF_MAX)
+            time.sleep(wait)
+        return resp
+
+    @staticmethod
+    def _headers_for(cookie: str, user_id: str) -> tuple[dict, dict]:
+        """构建账号的请求头 (POST 用, GET/DELETE 用)，每个账号只需构建一次
+
+        其余默认头由 session 提供；只有 POST 带 content-type。
+        """
+        get_headers = {"cookie": cookie, "new-api-user": user_id}
+        return {**get_headers, "content-type": "application/json"}, get_headers
+
+    def _run_paced(self, func, items: list, delay: float):
+        """在线程池中并发执行 func(item)，按完成顺序产出 (item, result)
+
+        请求开始时间仍由同一个 RateLimiter 控制间隔，线程池只是让慢请求之间互相重叠。
+        """
+        limiter = RateLimiter(delay, max_wait=self.RETRY_MAX_WAIT)
+
+        def run(item):
+            limiter.wait()
+            result = func(item)
+            limiter.update(result.get("headers"))
+            return item, result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(items), self.MAX_WORKERS))) as pool:
+            futures = [pool.submit(run, item) for item in items]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def search_tokens(
+        self, headers: dict, keyword: str, names: set[str] | None = None
+    ) -> dict[str, str]:
+        """搜索 token 获取实际的 key，返回 {name: key} 映射
+
+        指定 names 时只返回其中的 token (搜索结果可能包含同前缀的历史 token)。
+        """
         try:
-            resp = requests.get(
+            resp = self._request(
+                "GET",
                 self.SEARCH_API_URL,
                 headers=headers,
                 params={"keyword": keyword, "token": ""},
-                timeout=30,
-                proxies=self.proxies,
             )
 
             if resp.status_code == 200:
-                data = resp.json()
+                data = _json_loads(resp.content)
                 if data.get("success"):
-                    tokens_data = data.get("data", [])
                     # 返回 {name: "sk-" + key} 映射
-                    return {
-                        t.get("name", ""): "sk-" + t.get("key", "")
-                        for t in tokens_data
-                        if t.get("name") and t.get("key")
-                    }
+                    key_map = {}
+                    for t in data.get("data") or ():
+                        name, key = t.get("name"), t.get("key")
+                        if name and key and (names is None or name in names):
+                            key_map[name] = "sk-" + key
+                    return key_map
         except Exception as e:
-            print(f"    [WARN] 搜索 token 失败: {e}")
+            _account_log(headers.get("new-api-user"), f"    [WARN] 搜索 token 失败: {e}")
 
         return {}
 
-    def create_token(self, cookie: str, user_id: str, token_name: str) -> dict | None:
+    def create_token(self, headers: dict, token_name: str) -> dict | None:
         """创建单个token"""
-        headers = self.HEADERS.copy()
-        headers["cookie"] = cookie
-        headers["new-api-user"] = user_id
-
-        payload = {
-            "name": token_name,
-            "remain_quota": self.token_config.get("remain_quota", 500000),
-            "expired_time": self.token_config.get("expired_time", -1),
-            "unlimited_quota": self.token_config.get("unlimited_quota", True),
-            "model_limits_enabled": self.token_config.get("model_limits_enabled", False),
-            "model_limits": self.token_config.get("model_limits", ""),
-            "allow_ips": self.token_config.get("allow_ips", ""),
-            "group": self.token_config.get("group", ""),
-        }
+        payload = {"name": token_name, **self._payload_base}
 
         try:
-            resp = requests.post(
-                self.API_URL, headers=headers, json=payload, timeout=30, proxies=self.proxies
-            )
+            resp = self._request("POST", self.API_URL, json=payload, headers=headers)
 
             # 调试: 打印原始响应
-            if resp.status_code != 200 or not resp.text.startswith("{"):
-                print(f"    [DEBUG] HTTP {resp.status_code}: {resp.text[:200]}")
+            if resp.status_code != 200 or not resp.content.startswith(b"{"):
+                _account_log(
+                    headers.get("new-api-user"),
+                    f"    [DEBUG] HTTP {resp.status_code}: {resp.text[:200]}",
+                )
 
-            data = resp.json()
+            data = _json_loads(resp.content)
 
             if resp.status_code == 200 and data.get("success", False):
                 # 尝试多种可能的 key 路径
+                inner = data.get("data") or {}
                 token_key = (
-                    data.get("data", {}).get("key", "")
-                    or data.get("key", "")
-                    or data.get("data", {}).get("token", "")
-                    or data.get("token", "")
+                    inner.get("key")
+                    or data.get("key")
+                    or inner.get("token")
+                    or data.get("token")
+                    or ""
                 )
                 if not token_key:
-                    print(f"    [DEBUG] 响应数据: {json.dumps(data, ensure_ascii=False)[:300]}")
-                return {"success": True, "key": token_key, "data": data}
+                    _account_log(
+                        headers.get("new-api-user"),
+                        f"    [DEBUG] 响应数据: {json.dumps(data, ensure_ascii=False)[:300]}",
+                    )
+                return {"success": True, "key": token_key, "data": data, "headers": resp.headers}
             else:
-                return {"success": False, "error": data.get("message", str(data))}
+                return {
+                    "success": False,
+                    "error": data.get("message", str(data)),
+                    "headers": resp.headers,
+                }
         except Exception as e:
             return {"success": False, "error": str(e)}
 
-    def list_tokens(self, cookie: str, user_id: str, page: int = 0, size: int = 100) -> list[dict]:
-        """获取 token 列表"""
-        headers = self.HEADERS.copy()
-        headers["cookie"] = cookie
-        headers["new-api-user"] = user_id
-        # GET 请求不需要 content-type
-        headers.pop("content-type", None)
-
+    def _list_tokens_page(
+        self, headers: dict, page: int = 0, size: int = 100
+    ) -> tuple[list[dict], int | None]:
+        """获取一页 token，返回 (token 列表, 总数)；接口未返回总数时总数为 None"""
         try:
-            resp = requests.get(
-                f"{self.API_URL}?p={page}&size={size}",
-                headers=headers,
-                timeout=30,
-                proxies=self.proxies,
-            )
+            resp = self._request("GET", f"{self.API_URL}?p={page}&size={size}", headers=headers)
 
             if resp.status_code == 200:
-                data = resp.json()
+                data = _json_loads(resp.content)
                 if data.get("success"):
-                    return data.get("data", [])
+                    page_data = data.get("data") or []
+                    # 新版接口返回 {"items": [...], "total": N}
+                    if isinstance(page_data, dict):
+                        return page_data.get("items") or [], page_data.get("total")
+                    return page_data, None
                 else:
-                    print(f"    [WARN] 获取 token 列表失败: {data.get('message', '未知错误')}")
+                    _account_log(
+                        headers.get("new-api-user"),
+                        f"    [WARN] 获取 token 列表失败: {data.get('message', '未知错误')}",
+                    )
             else:
-                print(f"    [WARN] 获取 token 列表 HTTP {resp.status_code}")
+                _account_log(
+                    headers.get("new-api-user"),
+                    f"    [WARN] 获取 token 列表 HTTP {resp.status_code}",
+                )
         except Exception as e:
-            print(f"    [WARN] 获取 token 列表异常: {e}")
+            _account_log(headers.get("new-api-user"), f"    [WARN] 获取 token 列表异常: {e}")
 
-        return []
+        return [], None
 
-    def delete_token(self, cookie: str, user_id: str, token_id: int) -> dict:
-        """删除单个 token"""
-        headers = self.HEADERS.copy()
-        headers["cookie"] = cookie
-        headers["new-api-user"] = user_id
-        # DELETE 请求不需要 content-type
-        headers.pop("content-type", None)
+    def list_tokens(self, headers: dict, page: int = 0, size: int = 100) -> list[dict]:
+        """获取 token 列表"""
+        return self._list_tokens_page(headers, page, size)[0]
+
+    def list_all_tokens(self, headers: dict, size: int = 100) -> list[dict]:
+        """获取全部 token
 
+        先取第 0 页；接口返回总数时其余页并发获取，否则按 1, 2, 4... 页的窗口
+        逐批并发探测，直到某页不满为止。
+        """
+        tokens, total = self._list_tokens_page(headers, 0, size)
+        if len(tokens) < size:
+            return tokens
+
+        def fetch(page: int) -> list[dict]:
+            return self.list_tokens(headers, page, size)
+
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as pool:
+            if total is not None:
+                # 页码可能从 0 或 1 开始，多取一页，重复的由下方去重
+                for page_tokens in pool.map(fetch, range(1, math.ceil(total / size) + 1)):
+                    tokens.extend(page_tokens)
+            else:
+                page, window = 1, 1
+                while True:
+                    batch = list(pool.map(fetch, range(page, page + window)))
+                    for page_tokens in batch:
+                        tokens.extend(page_tokens)
+                    if any(len(page_tokens) < size for page_tokens in batch):
+                        break
+                    page += window
+                    window = min(window * 2, self.MAX_WORKERS)
+
+        # 新版接口页码从 1 开始 (p=0 与 p=1 是同一页)，按 id 去重
+        unique = {}
+        for token in tokens:
+            unique.setdefault(token.get("id"), token)
+        return list(unique.values())
+
+    def delete_token(self, headers: dict, token_id: int) -> dict:
+        """删除单个 token"""
         try:
-            resp = requests.delete(
-                f"{self.API_URL}{token_id}",
-                headers=headers,
-                timeout=30,
-                proxies=self.proxies,
-            )
+            resp = self._request("DELETE", f"{self.API_URL}{token_id}", headers=headers)
 
-            data = resp.json() if resp.text.startswith("{") else {"success": False}
+            data = _json_loads(resp.content) if resp.content.startswith(b"{") else {"success": False}
 
             if resp.status_code == 200 and data.get("success"):
-                return {"success": True, "id": token_id}
+                return {"success": True, "id": token_id, "headers": resp.headers}
             else:
-                return {"success": False, "id": token_id, "error": data.get("message", str(data))}
+                return {
+                    "success": False,
+                    "id": token_id,
+                    "error": data.get("message", str(data)),
+                    "headers": resp.headers,
+                }
         except Exception as e:
             return {"success": False, "id": token_id, "error": str(e)}
 
@@ -396,54 +730,57 @@ class TokenCreator:
         self, cookie: str, user_id: str, prefix: str, count: int, delay: float = 0.5
     ):
         """批量创建token"""
-        print(f"\n{'='*50}")
-        print(f"用户ID: {user_id}")
-        print(f"创建数量: {count}")
-        print(f"名称前缀: {prefix}")
-        print(f"{'='*50}\n")
+        _account_log(
+            user_id,
+            f"\n{'='*50}\n"
+            f"用户ID: {user_id}\n"
+            f"创建数量: {count}\n"
+            f"名称前缀: {prefix}\n"
+            f"{'='*50}\n",
+        )
+
+        post_headers, get_headers = self._headers_for(cookie, user_id)
 
         success_count = 0
         fail_count = 0
         created_names = []  # 成功创建的 token 名称
 
-        for i in range(1, count + 1):
-            if count == 1:
-                token_name = "cc"
-            else:
-                random_str = "".join(random.choices(string.ascii_lowercase + string.digits, k=8))
-                token_name = f"{prefix}_{random_str}"
-
-            result = self.create_token(cookie, user_id, token_name)
+        if count == 1:
+            token_names = ["cc"]
+        else:
+            token_names = [f"{prefix}_{secrets.token_hex(4)}" for _ in range(count)]
 
+        for token_name, result in self._run_paced(
+            lambda name: self.create_token(post_headers, name), token_names, delay
+        ):
             if result and result["success"]:
-                print(f"  [\033[32mOK\033[0m] {token_name} (created)")
+                _account_log(user_id, f"  [\033[32mOK\033[0m] {token_name} (created)")
                 created_names.append(token_name)
                 success_count += 1
             else:
                 error = result.get("error", "未知错误") if result else "请求失败"
-                print(f"  [\033[31mFAIL\033[0m] {token_name} -> {error}")
+                _account_log(user_id, f"  [\033[31mFAIL\033[0m] {token_name} -> {error}")
                 fail_count += 1
 
-            if i < count:
-                time.sleep(delay)
-
         # 通过搜索 API 获取实际的 key
         tokens = []
         if created_names:
-            print(f"\n[INFO] 正在获取 token keys...")
+            _account_log(user_id, f"\n[INFO] 正在获取 token keys...")
             search_keyword = "cc" if count == 1 else prefix
-            key_map = self.search_tokens(cookie, user_id, search_keyword)
+            key_map = self.search_tokens(get_headers, search_keyword, set(created_names))
 
             for name in created_names:
                 key = key_map.get(name, "")
                 if key:
-                    print(f"  [KEY] {name} -> {key}")
+                    _account_log(user_id, f"  [KEY] {name} -> {key}")
                 else:
-                    print(f"  [WARN] {name} -> (key not found)")
+                    _account_log(user_id, f"  [WARN] {name} -> (key not found)")
                 tokens.append({"name": name, "key": key, "user_id": user_id})
 
-        self.created_tokens.extend(tokens)
-        print(f"\n完成! \033[32m成功: {success_count}\033[0m, \033[31m失败: {fail_count}\033[0m")
+        _account_log(
+            user_id,
+            f"\n完成! \033[32m成功: {success_count}\033[0m, \033[31m失败: {fail_count}\033[0m",
+        )
         return tokens
 
     def batch_delete(
@@ -467,18 +804,24 @@ class TokenCreator:
             delay: 删除间隔秒数
             dry_run: 仅预览不实际删除
         """
-        print(f"\n{'='*50}")
-        print(f"用户ID: {user_id}")
         if token_ids:
-            print(f"删除模式: 指定 ID 列表 ({len(token_ids)} 个)")
+            mode = f"指定 ID 列表 ({len(token_ids)} 个)"
         elif prefix:
-            print(f"删除模式: 名称前缀匹配 '{prefix}'")
+            mode = f"名称前缀匹配 '{prefix}'"
         elif keyword:
-            print(f"删除模式: 关键词搜索 '{keyword}'")
+            mode = f"关键词搜索 '{keyword}'"
         else:
-            print(f"删除模式: 全部删除")
-        print(f"预览模式: {'是' if dry_run else '否'}")
-        print(f"{'='*50}\n")
+            mode = "全部删除"
+        _account_log(
+            user_id,
+            f"\n{'='*50}\n"
+            f"用户ID: {user_id}\n"
+            f"删除模式: {mode}\n"
+            f"预览模式: {'是' if dry_run else '否'}\n"
+            f"{'='*50}\n",
+        )
+
+        _, headers = self._headers_for(cookie, user_id)
 
         # 获取要删除的 token 列表
         to_delete = []
@@ -488,19 +831,10 @@ class TokenCreator:
             to_delete = [{"id": tid, "name": f"(ID: {tid})"} for tid in token_ids]
         else:
             # 从 API 获取 token 列表
-            print("[INFO] 正在获取 token 列表...")
-            all_tokens = []
-            page = 0
-            while True:
-                tokens = self.list_tokens(cookie, user_id, page=page, size=100)
-                if not tokens:
-                    break
-                all_tokens.extend(tokens)
-                if len(tokens) < 100:
-                    break
-                page += 1
-
-            print(f"[INFO] 共找到 {len(all_tokens)} 个 token")
+            _account_log(user_id, "[INFO] 正在获取 token 列表...")
+            all_tokens = self.list_all_tokens(headers, size=100)
+
+            _account_log(user_id, f"[INFO] 共找到 {len(all_tokens)} 个 token")
 
             # 过滤
             for token in all_tokens:
@@ -515,48 +849,91 @@ class TokenCreator:
                     to_delete.append(token)
 
         if not to_delete:
-            print("[INFO] 没有找到匹配的 token")
+            _account_log(user_id, "[INFO] 没有找到匹配的 token")
             return []
 
         # 显示预览
-        print(f"\n[INFO] 将删除以下 {len(to_delete)} 个 token:")
-        for token in to_delete[:10]:
-            print(f"  - [{token.get('id')}] {token.get('name')}")
+        preview = [f"\n[INFO] 将删除以下 {len(to_delete)} 个 token:"]
+        preview += [f"  - [{token.get('id')}] {token.get('name')}" for token in to_delete[:10]]
         if len(to_delete) > 10:
-            print(f"  ... 还有 {len(to_delete) - 10} 个")
+            preview.append(f"  ... 还有 {len(to_delete) - 10} 个")
+        _account_log(user_id, "\n".join(preview))
 
         if dry_run:
-            print("\n[DRY RUN] 仅预览，未实际删除")
+            _account_log(user_id, "\n[DRY RUN] 仅预览，未实际删除")
             return to_delete
 
         # 执行删除
-        print(f"\n[INFO] 开始删除...")
+        _account_log(user_id, f"\n[INFO] 开始删除...")
         success_count = 0
         fail_count = 0
         deleted_ids = []
 
-        for i, token in enumerate(to_delete, 1):
+        for token, result in self._run_paced(
+            lambda t: self.delete_token(headers, t.get("id")), to_delete, delay
+        ):
             token_id = token.get("id")
             token_name = token.get("name", "")
 
-            result = self.delete_token(cookie, user_id, token_id)
-
             if result["success"]:
-                print(f"  [\033[32mOK\033[0m] {token_name} (ID: {token_id})")
+                _account_log(user_id, f"  [\033[32mOK\033[0m] {token_name} (ID: {token_id})")
                 success_count += 1
                 deleted_ids.append(token_id)
             else:
                 error = result.get("error", "未知错误")
-                print(f"  [\033[31mFAIL\033[0m] {token_name} (ID: {token_id}) -> {error}")
+                _account_log(
+                    user_id,
+                    f"  [\033[31mFAIL\033[0m] {token_name} (ID: {token_id}) -> {error}",
+                )
                 fail_count += 1
 
-            if i < len(to_delete):
-                time.sleep(delay)
-
-        print(f"\n完成! \033[32m成功: {success_count}\033[0m, \033[31m失败: {fail_count}\033[0m")
+        _account_log(
+            user_id,
+            f"\n完成! \033[32m成功: {success_count}\033[0m, \033[31m失败: {fail_count}\033[0m",
+        )
         return deleted_ids
 
 
+def _iter_account_lines(lines):
+    """按行解析账号配置，逐个产出账号 dict"""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        # 尝试解析为JSON对象
+        if line.startswith("{"):
+            try:
+                yield _json_loads(line)
+                continue
+            except json.JSONDecodeError:
+                pass
+
+        # 分隔符格式: cookie|user_id|prefix|count (纯cookie 时只有第一段，多余字段忽略)
+        parts = line.split("|")
+        account = {"cookie": parts[0]}
+        if len(parts) > 1:
+            account["user_id"] = parts[1]
+        if len(parts) > 2:
+            account["prefix"] = parts[2]
+        if len(parts) > 3:
+            try:
+                account["count"] = int(parts[3])
+            except ValueError:
+                print(f"警告: 无法解析的行，已跳过: {line[:50]}")
+                continue
+        yield account
+
+
+def _load_json_array_file(path: Path) -> list[dict] | None:
+    """用 ijson 逐条解析 JSON 数组文件，不是合法 JSON 时返回 None"""
+    try:
+        with path.open("rb") as f:
+            return list(ijson.items(f, "item", use_float=True))
+    except ijson.JSONError:
+        return None
+
+
 def parse_cookie_file(file_path: str) -> list[dict]:
     """
     解析cookie文件
@@ -565,18 +942,33 @@ def parse_cookie_file(file_path: str) -> list[dict]:
     2. 分隔符格式: cookie|user_id|prefix|count
     3. 纯cookie (需要命令行指定user_id)
     """
-    accounts = []
     path = Path(file_path)
 
     if not path.exists():
         print(f"错误: 文件不存在 {file_path}")
         sys.exit(1)
 
-    content = path.read_text(encoding="utf-8").strip()
+    with path.open("r", encoding="utf-8") as f:
+        # 找到第一个非空行，据此判断是否可能是整体 JSON
+        first = ""
+        for first in f:
+            if first.strip():
+                break
+
+        if not first.lstrip().startswith(("[", "{")):
+            return list(_iter_account_lines(itertools.chain([first], f)))
+
+        # JSON 数组: 安装了 ijson 时流式解析，无需把整个文件读入内存
+        if ijson is not None and first.lstrip().startswith("["):
+            accounts = _load_json_array_file(path)
+            if accounts is not None:
+                return accounts
+
+        content = first + f.read()
 
     # 尝试解析为JSON数组
     try:
-        data = json.loads(content)
+        data = _json_loads(content)
         if isinstance(data, list):
             return data
         elif isinstance(data, dict):
@@ -584,36 +976,90 @@ def parse_cookie_file(file_path: str) -> list[dict]:
     except json.JSONDecodeError:
         pass
 
-    # 按行解析
-    for line in content.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
+    # 每行一个 JSON 对象等情况，按行解析
+    return list(_iter_account_lines(content.splitlines()))
 
-        # 尝试解析为JSON对象
-        try:
-            account = json.loads(line)
-            accounts.append(account)
-            continue
-        except json.JSONDecodeError:
-            pass
-
-        # 分隔符格式: cookie|user_id|prefix|count
-        if "|" in line:
-            parts = line.split("|")
-            account = {"cookie": parts[0]}
-            if len(parts) > 1:
-                account["user_id"] = parts[1]
-            if len(parts) > 2:
-                account["prefix"] = parts[2]
-            if len(parts) > 3:
-                account["count"] = int(parts[3])
-            accounts.append(account)
+
+async def process_accounts(
+    accounts: list[dict],
+    work,
+    waf_cookies: dict[str, str],
+    default_user_id: str = None,
+    concurrency: int = 8,
+) -> list:
+    """并发处理所有账号，返回各账号 work(account, cookie, user_id) 结果列表的合并
+
+    各账号互不依赖，最多同时处理 concurrency 个；work 在线程中执行，
+    单个账号失败不影响其他账号。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(accounts)
+
+    async def process_one(idx: int, account: dict) -> list:
+        cookie = account.get("cookie", "")
+        user_id = account.get("user_id", default_user_id)
+
+        if not cookie:
+            print(f"\n[{idx}/{total}] 跳过: cookie为空")
+            return []
+
+        # 合并 WAF cookies
+        cookie = merge_waf_cookies(cookie, waf_cookies)
+
+        if not user_id:
+            print(f"\n[{idx}/{total}] 跳过: 未指定user_id")
+            return []
+
+        async with semaphore:
+            print(f"\n[{idx}/{total}] 处理账号 (用户ID: {user_id})...")
+            return await asyncio.to_thread(work, account, cookie, str(user_id))
+
+    results = await asyncio.gather(
+        *(process_one(idx, account) for idx, account in enumerate(accounts, 1)),
+        return_exceptions=True,
+    )
+
+    # 各账号返回各自的结果列表，在 gather 之后汇总，无需加锁
+    merged = []
+    for idx, result in enumerate(results, 1):
+        if isinstance(result, BaseException):
+            print(f"\n[{idx}/{total}] 处理失败: {result}")
         else:
-            # 纯cookie
-            accounts.append({"cookie": line})
+            merged.extend(result)
+    return merged
+
+
+def _positive_int(value: str) -> int:
+    """argparse 类型: 大于等于 1 的整数"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"应为大于等于 1 的整数: {value}")
+    return number
+
+
+def _build_token_config(args) -> dict:
+    """由命令行参数构建 Token 配置 (--config 中的字段覆盖默认值)"""
+    token_config = {
+        "remain_quota": args.quota,
+        "unlimited_quota": args.unlimited,
+        "expired_time": -1,
+        "model_limits_enabled": False,
+        "model_limits": "",
+        "allow_ips": "",
+        "group": "",
+    }
 
-    return accounts
+    if args.config:
+        try:
+            token_config.update(_json_loads(args.config))
+        except json.JSONDecodeError as e:
+            print(f"错误: 无法解析token配置 - {e}")
+            sys.exit(1)
+
+    return token_config
 
 
 async def main():
@@ -675,10 +1121,17 @@ Cookie文件格式:
     parser.add_argument("-d", "--delay", type=float, default=0.5, help="请求间隔秒数 (默认: 0.5)")
     parser.add_argument("--unlimited", action="store_true", default=True, help="无限配额")
     parser.add_argument("--proxy", help="代理地址 (如: http://127.0.0.1:7890)")
+    parser.add_argument(
+        "--concurrency", type=_positive_int, default=8, help="同时处理的账号数 (默认: 8)"
+    )
     parser.add_argument(
         "--no-waf", action="store_true", default=False,
         help="跳过 WAF 过盾 (如果已有 WAF cookies 在 cookie 中)",
     )
+    parser.add_argument(
+        "--refresh-waf", action="store_true", default=False,
+        help="忽略 WAF cookies 缓存，重新启动浏览器获取",
+    )
     parser.add_argument(
         "--dry-run", action="store_true", default=False,
         help="预览模式 (仅显示将要删除的token，不实际删除)",
@@ -687,146 +1140,97 @@ Cookie文件格式:
     args = parser.parse_args()
 
     # Token配置
-    token_config = {
-        "remain_quota": args.quota,
-        "unlimited_quota": args.unlimited,
-        "expired_time": -1,
-        "model_limits_enabled": False,
-        "model_limits": "",
-        "allow_ips": "",
-        "group": "",
-    }
+    token_config = _build_token_config(args)
 
-    if args.config:
-        try:
-            config_data = json.loads(args.config)
-            token_config.update(config_data)
-        except json.JSONDecodeError as e:
-            print(f"错误: 无法解析token配置 - {e}")
-            sys.exit(1)
-
-    # 获取cookie列表
+    # 获取cookie列表 (WAF 步骤需要据此判断是否可跳过，此时尚无其他任务需要事件循环)
     if args.api_token:
         accounts = fetch_cookies_from_api(args.api_token)
     else:
         accounts = parse_cookie_file(args.file)
 
-    if not accounts:
-        print("错误: 未找到有效的账号配置")
-        sys.exit(1)
-
-    print(f"已加载 {len(accounts)} 个账号配置")
-
     # 获取 WAF cookies (访问 anyrouter.top 需要代理)
     waf_cookies = {}
-    if not args.no_waf:
-        waf_cookies = await get_waf_cookies(proxy=args.proxy)
-        if waf_cookies is None:
-            print("[WAF] 无法获取 WAF cookies, 将尝试不带 WAF cookies 继续")
-            waf_cookies = {}
-    else:
+    if args.no_waf:
         print("[WAF] 已跳过 WAF 过盾 (--no-waf)")
+    elif (
+        accounts
+        and not args.refresh_waf
+        and all(has_waf_cookies(a.get("cookie")) for a in accounts)
+    ):
+        # 所有账号的 cookie 已带齐 WAF cookies 时无需启动浏览器 (--refresh-waf 时仍重新获取)
+        print("[WAF] 所有账号的 cookie 已包含 WAF cookies, 跳过过盾")
+    elif accounts:
+        waf_cookies = await resolve_waf_cookies(args.proxy, refresh=args.refresh_waf)
 
-    creator = TokenCreator({}, proxy=args.proxy)
-
-    # 删除模式
-    if args.delete:
-        # 解析 ID 列表
-        token_ids = None
-        if args.delete_ids:
-            try:
-                token_ids = [int(x.strip()) for x in args.delete_ids.split(",")]
-            except ValueError:
-                print("错误: --delete-ids 格式不正确，应为逗号分隔的数字")
-                sys.exit(1)
-
-        all_deleted = []
-
-        for idx, account in enumerate(accounts, 1):
-            cookie = account.get("cookie", "")
-            user_id = account.get("user_id", args.user_id)
-
-            if not cookie:
-                print(f"\n[{idx}/{len(accounts)}] 跳过: cookie为空")
-                continue
+    if not accounts:
+        print("错误: 未找到有效的账号配置")
+        sys.exit(1)
 
-            # 合并 WAF cookies
-            cookie = merge_waf_cookies(cookie, waf_cookies)
+    print(f"已加载 {len(accounts)} 个账号配置")
 
-            if not user_id:
-                print(f"\n[{idx}/{len(accounts)}] 跳过: 未指定user_id")
-                continue
+    with TokenCreator(token_config, proxy=args.proxy) as creator:
+        # 删除模式
+        if args.delete:
+            # 解析 ID 列表
+            token_ids = None
+            if args.delete_ids:
+                try:
+                    token_ids = [int(x.strip()) for x in args.delete_ids.split(",")]
+                except ValueError:
+                    print("错误: --delete-ids 格式不正确，应为逗号分隔的数字")
+                    sys.exit(1)
+
+            def delete_for_account(account: dict, cookie: str, user_id: str) -> list:
+                return creator.batch_delete(
+                    cookie,
+                    user_id,
+                    prefix=args.delete_prefix,
+                    keyword=args.delete_keyword,
+                    token_ids=token_ids,
+                    delay=args.delay,
+                    dry_run=args.dry_run,
+                )
 
-            print(f"\n[{idx}/{len(accounts)}] 处理账号...")
-            deleted = creator.batch_delete(
-                cookie,
-                str(user_id),
-                prefix=args.delete_prefix,
-                keyword=args.delete_keyword,
-                token_ids=token_ids,
-                delay=args.delay,
-                dry_run=args.dry_run,
+            all_deleted = await process_accounts(
+                accounts, delete_for_account, waf_cookies, args.user_id, args.concurrency
             )
-            all_deleted.extend(deleted)
 
-        print(f"\n总计删除: {len(all_deleted)} 个 token")
-        return
+            print(f"\n总计删除: {len(all_deleted)} 个 token")
+            return
 
-    # 创建模式 (原有逻辑)
-    token_config = {
-        "remain_quota": args.quota,
-        "unlimited_quota": args.unlimited,
-        "expired_time": -1,
-        "model_limits_enabled": False,
-        "model_limits": "",
-        "allow_ips": "",
-        "group": "",
-    }
-
-    if args.config:
-        try:
-            config_data = json.loads(args.config)
-            token_config.update(config_data)
-        except json.JSONDecodeError as e:
-            print(f"错误: 无法解析token配置 - {e}")
-            sys.exit(1)
-
-    for idx, account in enumerate(accounts, 1):
-        cookie = account.get("cookie", "")
-        user_id = account.get("user_id", args.user_id)
-        prefix = account.get("prefix", args.prefix)
-        count = account.get("count", args.count)
-
-        if not cookie:
-            print(f"\n[{idx}/{len(accounts)}] 跳过: cookie为空")
-            continue
-
-        # 合并 WAF cookies
-        cookie = merge_waf_cookies(cookie, waf_cookies)
-
-        if not user_id:
-            print(f"\n[{idx}/{len(accounts)}] 跳过: 未指定user_id")
-            continue
-
-        print(f"\n[{idx}/{len(accounts)}] 处理账号...")
-        creator.batch_create(cookie, str(user_id), prefix, count, args.delay)
-
-    # 保存结果
-    if creator.created_tokens:
+        # 创建模式 (原有逻辑)
         output_path = Path(args.output)
-        output_path.write_text(
-            json.dumps(creator.created_tokens, ensure_ascii=False, indent=2),
-            encoding="utf-8",
+        # 每个账号完成后立即追加到 JSONL，中途出错也不会丢失已创建的 token
+        progress_path = output_path.with_suffix(".jsonl")
+        progress_lock = threading.Lock()
+
+        # 账号内部仍按 --delay 间隔请求
+        def create_for_account(account: dict, cookie: str, user_id: str) -> list:
+            prefix = account.get("prefix", args.prefix)
+            count = account.get("count", args.count)
+            tokens = creator.batch_create(cookie, user_id, prefix, count, args.delay)
+            if tokens:
+                with progress_lock, progress_path.open("ab") as f:
+                    f.write(b"".join(map(_json_line, tokens)))
+            return tokens
+
+        created_tokens = await process_accounts(
+            accounts, create_for_account, waf_cookies, args.user_id, args.concurrency
         )
-        print(f"\n已保存 {len(creator.created_tokens)} 个token到: {args.output}")
 
-        # 输出纯key列表 (过滤空key)
-        keys_file = output_path.with_suffix(".txt")
-        valid_keys = [t["key"] for t in creator.created_tokens if t["key"]]
-        keys_file.write_text("\n".join(valid_keys), encoding="utf-8")
-        print(f"Token keys已保存到: {keys_file} ({len(valid_keys)} 个有效)")
-    else:
-        print("\n未创建任何token")
+        # 保存结果
+        if created_tokens:
+            print(f"\n已追加 {len(created_tokens)} 个token到: {progress_path}")
+            output_path.write_bytes(_json_dumps(created_tokens))
+            print(f"已保存 {len(created_tokens)} 个token到: {args.output}")
+
+            # 输出纯key列表 (过滤空key)
+            keys_file = output_path.with_suffix(".txt")
+            valid_keys = [t["key"] for t in created_tokens if t["key"]]
+            keys_file.write_bytes("\n".join(valid_keys).encode("utf-8"))
+            print(f"Token keys已保存到: {keys_file} ({len(valid_keys)} 个有效)")
+        else:
+            print("\n未创建任何token")
 
 
 if __name__ == "__main__":
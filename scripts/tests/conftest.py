@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# create_tokens.py 是独立脚本，不在包内；缺少 requests 时脚本会直接退出
+pytest.importorskip("requests")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import create_tokens as ct
+
+WAF = {"acw_tc": "a", "cdn_sec_tc": "b", "acw_sc__v2": "c"}
+
+
+class TestMergeWafCookies:
+    def test_empty_waf_cookies_returns_original(self):
+        assert ct.merge_waf_cookies("session=x", {}) == "session=x"
+
+    def test_appends_waf_cookies(self):
+        merged = ct.merge_waf_cookies("session=x; other=y", WAF)
+        assert merged == "session=x; other=y; acw_tc=a; cdn_sec_tc=b; acw_sc__v2=c"
+
+    def test_waf_cookies_override_existing(self):
+        merged = ct.merge_waf_cookies(" acw_tc = old ;session=x;", {"acw_tc": "new"})
+        assert merged == "acw_tc=new; session=x"
+
+    def test_empty_original(self):
+        assert ct.merge_waf_cookies("", {"acw_tc": "a"}) == "acw_tc=a"
+
+
+class TestHasWafCookies:
+    def test_all_present(self):
+        assert ct.has_waf_cookies("session=x; acw_tc=a; cdn_sec_tc=b; acw_sc__v2=c")
+
+    def test_partial(self):
+        assert not ct.has_waf_cookies("session=x; acw_tc=a; cdn_sec_tc=b")
+
+    def test_name_must_match_exactly(self):
+        # 值或其他 cookie 名中包含 WAF cookie 名不算
+        assert not ct.has_waf_cookies("x_acw_tc=1; cdn_sec_tc=b; acw_sc__v2=c; y=acw_tc")
+
+    @pytest.mark.parametrize("cookie", ["", None])
+    def test_empty(self, cookie):
+        assert not ct.has_waf_cookies(cookie)
+
+
+class TestParseCookieFile:
+    @pytest.fixture(params=[True, False], ids=["ijson", "no-ijson"])
+    def parse(self, request, monkeypatch, tmp_path):
+        if request.param:
+            pytest.importorskip("ijson")
+        else:
+            monkeypatch.setattr(ct, "ijson", None)
+
+        def parse(text):
+            path = tmp_path / "cookies.txt"
+            path.write_text(text, encoding="utf-8")
+            return ct.parse_cookie_file(str(path))
+
+        return parse
+
+    def test_pipe_format(self, parse):
+        text = "\n".join([
+            "# 注释",
+            "",
+            "session=a|1|p|3",
+            "session=b|2",
+            "session=c",
+            "session=d|4|p| 5",
+            "session=e|5|p|6|extra",
+        ])
+        assert parse(text) == [
+            {"cookie": "session=a", "user_id": "1", "prefix": "p", "count": 3},
+            {"cookie": "session=b", "user_id": "2"},
+            {"cookie": "session=c"},
+            {"cookie": "session=d", "user_id": "4", "prefix": "p", "count": 5},
+            {"cookie": "session=e", "user_id": "5", "prefix": "p", "count": 6},
+        ]
+
+    def test_bad_count_row_is_skipped(self, parse, capsys):
+        assert parse("session=a|1|p|x\nsession=b|2\n") == [
+            {"cookie": "session=b", "user_id": "2"}
+        ]
+        assert "无法解析的行" in capsys.readouterr().out
+
+    def test_json_array(self, parse):
+        accounts = [{"cookie": "session=a", "user_id": 1, "count": 2}, {"cookie": "session=b"}]
+        assert parse("\n  " + json.dumps(accounts, indent=2)) == accounts
+
+    def test_json_object(self, parse):
+        account = {"cookie": "session=a", "user_id": "1"}
+        assert parse(json.dumps(account, indent=2)) == [account]
+
+    def test_json_lines(self, parse):
+        text = '{"cookie": "session=a"}\n{"cookie": "session=b", "user_id": "2"}\n'
+        assert parse(text) == [{"cookie": "session=a"}, {"cookie": "session=b", "user_id": "2"}]
+
+    def test_json_lines_mixed_with_pipe_rows(self, parse):
+        text = '{"cookie": "session=a"}\nsession=b|2\n'
+        assert parse(text) == [{"cookie": "session=a"}, {"cookie": "session=b", "user_id": "2"}]
+
+    def test_missing_file_exits(self, tmp_path):
+        with pytest.raises(SystemExit):
+            ct.parse_cookie_file(str(tmp_path / "missing.txt"))
@@ -0,0 +1,157 @@
+import json
+import re
+
+import pytest
+
+import create_tokens as ct
+
+HEADERS = {"cookie": "session=x", "new-api-user": "1"}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(data if data is not None else {}).encode()
+        self.text = self.content.decode()
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def creator():
+    with ct.TokenCreator({}) as creator:
+        yield creator
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(ct.time, "sleep", waits.append)
+    return waits
+
+
+def serve(creator, monkeypatch, responses):
+    """按顺序返回 responses，记录请求方法"""
+    calls = []
+    responses = iter(responses)
+
+    def request(method, url, **kwargs):
+        calls.append(method)
+        return next(responses)
+
+    monkeypatch.setattr(creator._session, "request", request)
+    return calls
+
+
+class TestRequestRetry:
+    def test_success_is_not_retried(self, creator, monkeypatch, sleeps):
+        calls = serve(creator, monkeypatch, [FakeResponse(200)])
+        assert creator._request("GET", ct.TokenCreator.API_URL).status_code == 200
+        assert calls == ["GET"]
+        assert sleeps == []
+
+    def test_honors_retry_after(self, creator, monkeypatch, sleeps):
+        serve(creator, monkeypatch, [
+            FakeResponse(429, headers={"Retry-After": "2"}),
+            FakeResponse(200),
+        ])
+        assert creator._request("GET", ct.TokenCreator.API_URL).status_code == 200
+        assert sleeps == [2.0]
+
+    def test_retry_after_is_capped(self, creator, monkeypatch, sleeps):
+        serve(creator, monkeypatch, [
+            FakeResponse(503, headers={"Retry-After": "86400"}),
+            FakeResponse(200),
+        ])
+        creator._request("GET", ct.TokenCreator.API_URL)
+        assert sleeps == [ct.TokenCreator.RETRY_MAX_WAIT]
+
+    def test_exponential_backoff_without_retry_after(self, creator, monkeypatch, sleeps):
+        monkeypatch.setattr(ct.random, "uniform", lambda a, b: 0)
+        calls = serve(creator, monkeypatch, [FakeResponse(502)] * 10)
+
+        resp = creator._request("GET", ct.TokenCreator.API_URL)
+
+        # 重试次数用尽后返回最后一次响应
+        assert resp.status_code == 502
+        assert len(calls) == ct.TokenCreator.MAX_RETRIES + 1
+        assert sleeps == pytest.approx([0.3, 0.6, 1.2, 2.4])
+
+    def test_backoff_is_capped(self, creator, monkeypatch, sleeps):
+        monkeypatch.setattr(ct.random, "uniform", lambda a, b: b)
+        monkeypatch.setattr(ct.TokenCreator, "RETRY_BACKOFF", 8)
+        serve(creator, monkeypatch, [FakeResponse(500)] * 10)
+        creator._request("GET", ct.TokenCreator.API_URL)
+        assert max(sleeps) == ct.TokenCreator.RETRY_BACKOFF_MAX
+
+    def test_post_is_not_retried_on_5xx(self, creator, monkeypatch, sleeps):
+        # POST 非幂等，5xx 时请求可能已生效，重试会重复创建 token
+        calls = serve(creator, monkeypatch, [FakeResponse(500), FakeResponse(200)])
+        assert creator._request("POST", ct.TokenCreator.API_URL).status_code == 500
+        assert calls == ["POST"]
+
+    def test_post_is_retried_on_429(self, creator, monkeypatch, sleeps):
+        calls = serve(creator, monkeypatch, [
+            FakeResponse(429, headers={"Retry-After": "1"}),
+            FakeResponse(200),
+        ])
+        assert creator._request("POST", ct.TokenCreator.API_URL).status_code == 200
+        assert calls == ["POST", "POST"]
+
+    def test_proxy_is_passed_per_request(self, monkeypatch):
+        seen = []
+
+        def request(method, url, **kwargs):
+            seen.append(kwargs.get("proxies"))
+            return FakeResponse(200)
+
+        with ct.TokenCreator({}, proxy="http://127.0.0.1:1080") as creator:
+            monkeypatch.setattr(creator._session, "request", request)
+            creator._request("GET", ct.TokenCreator.API_URL)
+
+        assert seen == [{"http": "http://127.0.0.1:1080", "https": "http://127.0.0.1:1080"}]
+
+
+def serve_token_pages(creator, monkeypatch, count, first_page, with_total):
+    """模拟分页接口: 共 count 个 token，页码从 first_page 开始 (p=0 与 p=1 同页)"""
+    requested = []
+
+    def request(method, url, **kwargs):
+        page, size = map(int, re.search(r"p=(\d+)&size=(\d+)", url).groups())
+        requested.append(page)
+        start = max(page - first_page, 0) * size
+        items = [{"id": i, "name": f"token_{i}"} for i in range(start, min(start + size, count))]
+        data = {"items": items, "total": count} if with_total else items
+        return FakeResponse(200, {"success": True, "data": data})
+
+    monkeypatch.setattr(creator._session, "request", request)
+    return requested
+
+
+class TestListAllTokens:
+    @pytest.mark.parametrize("first_page", [0, 1])
+    @pytest.mark.parametrize("with_total", [True, False], ids=["total", "probe"])
+    def test_collects_every_token_once(self, creator, monkeypatch, first_page, with_total):
+        serve_token_pages(creator, monkeypatch, 230, first_page, with_total)
+
+        tokens = creator.list_all_tokens(HEADERS, size=100)
+
+        ids = [t["id"] for t in tokens]
+        assert len(ids) == len(set(ids))
+        assert set(ids) == set(range(230))
+
+    def test_single_page(self, creator, monkeypatch):
+        requested = serve_token_pages(creator, monkeypatch, 30, 1, True)
+        assert len(creator.list_all_tokens(HEADERS, size=100)) == 30
+        assert requested == [0]
+
+    def test_exact_multiple_of_page_size(self, creator, monkeypatch):
+        serve_token_pages(creator, monkeypatch, 200, 1, False)
+        assert len(creator.list_all_tokens(HEADERS, size=100)) == 200
+
+
+class TestRateLimiter:
+    def test_server_wait_is_capped(self):
+        limiter = ct.RateLimiter(0.1, max_wait=5)
+        now = ct.time.monotonic()
+        limiter.update({"Retry-After": "86400"})
+        assert limiter._next_allowed - now == pytest.approx(5, abs=0.5)